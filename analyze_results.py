@@ -1,11 +1,32 @@
-import pandas as pd
+import csv
 import os
-import re
+from collections import Counter
+import matplotlib
+matplotlib.use("Agg") # Headless backend; must be set before importing pyplot
 import matplotlib.pyplot as plt
 
 RESULTS_FILE = "results.csv"
 CHART_FILE = "error_patterns_barchart.png"
 
+# Figure and axes for the bar chart, created on first use and reused
+_FIG = None
+_AX = None
+
+# Question-type keywords, in priority order: the first category with
+# a keyword found in the question wins.
+QUESTION_TYPE_RULES = (
+    (("flaw", "vulnerable to criticism"), "Flaw"),
+    (("assumption",), "Assumption"),
+    (("strengthen", "supports", "helps to"), "Strengthen"),
+    (("weaken", "casts doubt"), "Weaken"),
+    (("infer", "must be true"), "Inference (Must Be True)"),
+    (("parallel", "similar to"), "Parallel Reasoning"),
+    (("main point", "main conclusion"), "Main Point"),
+    (("principle",), "Principle"),
+    (("reconcile", "explain the discrepancy"), "Resolve/Reconcile"),
+    (("accurately describes",), "Method of Reasoning"),
+)
+
 def categorize_question(question_text):
     """
     Analyzes the question text and assigns it to a
@@ -17,56 +38,44 @@ def categorize_question(question_text):
         
     q_lower = question_text.lower() # Make it case-insensitive
     
-    if "flaw" in q_lower or "vulnerable to criticism" in q_lower:
-        return "Flaw"
-    if "assumption" in q_lower:
-        return "Assumption"
-    if "strengthen" in q_lower or "supports" in q_lower or "helps to" in q_lower:
-        return "Strengthen"
-    if "weaken" in q_lower or "casts doubt" in q_lower:
-        return "Weaken"
-    if "infer" in q_lower or "must be true" in q_lower:
-        return "Inference (Must Be True)"
-    if "parallel" in q_lower or "similar to" in q_lower:
-        return "Parallel Reasoning"
-    if "main point" in q_lower or "main conclusion" in q_lower:
-        return "Main Point"
-    if "principle" in q_lower:
-        return "Principle"
-    if "reconcile" in q_lower or "explain the discrepancy" in q_lower:
-        return "Resolve/Reconcile"
-    if "accurately describes" in q_lower:
-        return "Method of Reasoning"
+    for keywords, label in QUESTION_TYPE_RULES:
+        if any(keyword in q_lower for keyword in keywords):
+            return label
         
     return "Other/Uncategorized"
 
 def create_error_barchart(error_counts):
     """
     Creates and saves a horizontal bar chart of the error counts.
+    'error_counts' is a Counter of question type -> number of failures.
     """
-    if error_counts.empty:
+    global _FIG, _AX
+
+    if not error_counts:
         return # Don't create a chart if there are no errors
 
     try:
         # Invert the data so the most common error is at the top
-        error_counts = error_counts.iloc[::-1]
+        question_types, counts = zip(*reversed(error_counts.most_common()))
         
-        plt.figure(figsize=(10, 8))
+        if _FIG is None:
+            _FIG, _AX = plt.subplots(figsize=(10, 8))
+        else:
+            _AX.clear() # Reuse the figure from the previous chart
         
         # Create a horizontal bar chart
-        error_counts.plot(kind='barh', color='#ff6b6b')
+        _AX.barh(question_types, counts, color='#ff6b6b')
         
-        plt.title('Recurring Patterns of LLM Error by Question Type', fontsize=16)
-        plt.xlabel('Number of Failures', fontsize=12)
-        plt.ylabel('LSAT Question Type', fontsize=12)
+        _AX.set_title('Recurring Patterns of LLM Error by Question Type', fontsize=16)
+        _AX.set_xlabel('Number of Failures', fontsize=12)
+        _AX.set_ylabel('LSAT Question Type', fontsize=12)
         
         # Ensure labels don't get cut off
-        plt.tight_layout()
+        _FIG.tight_layout()
         
         # Save the chart to a file
-        plt.savefig(CHART_FILE)
+        _FIG.savefig(CHART_FILE)
         print(f"Saved error analysis chart to: {CHART_FILE}")
-        plt.close()
 
     except Exception as e:
         print(f"Error creating bar chart: {e}")
@@ -83,75 +92,78 @@ def analyze_results():
         print("Please run 'python main.py' first to generate the results.")
         return
 
-    # Load the CSV into a pandas DataFrame
-    df = pd.read_csv(RESULTS_FILE)
+    # --- ANALYSIS ---
+    # Stream the CSV once, aggregating per question type.
+    # Every other statistic is derived from these two Counters.
+    total_problems = 0
+    api_error_count = 0
+    tested_counts = Counter()  # Successful requests per question type
+    correct_counts = Counter() # Correct answers per question type
+    
+    with open(RESULTS_FILE, newline="") as f:
+        for row in csv.DictReader(f):
+            total_problems += 1
+            
+            # 1. API errors are excluded from the accuracy stats
+            if row['llm_answer'] == 'API Error':
+                api_error_count += 1
+                continue
+            
+            # 2. Categorize and score the successful request
+            question_type = categorize_question(row['question_text'])
+            tested_counts[question_type] += 1
+            
+            if row['was_llm_correct'] == 'True':
+                correct_counts[question_type] += 1
     
-    total_problems = len(df)
     if total_problems == 0:
         print("Error: results.csv is empty.")
         return
 
-    # --- ANALYSIS ---
-    # 1. API Error Analysis
-    api_errors = df[df['llm_answer'] == 'API Error']
-    api_error_count = len(api_errors)
-    
     print("\n--- API & Parsing Health ---")
     print(f"Total Problems Processed: {total_problems}")
     print(f"API Errors (e.g., 429 Limit): {api_error_count}")
     
-    # 2. Filter out API errors to get a clean DataFrame for accuracy
-    clean_df = df[df['llm_answer'] != 'API Error'].copy()
-    
-    if clean_df.empty:
+    successful_count = tested_counts.total()
+    if successful_count == 0:
         print("No successful API responses to analyze.")
         return
         
-    # 3. Overall Statistics (on clean data)
-    accuracy = clean_df['was_llm_correct'].mean() * 100
-    correct_count = clean_df['was_llm_correct'].sum()
-    incorrect_count = len(clean_df) - correct_count
+    # 3. Overall Statistics (on successful requests)
+    correct_count = correct_counts.total()
+    accuracy = correct_count / successful_count * 100
+    incorrect_count = successful_count - correct_count
     
     print("\n--- Overall Performance (on successful requests) ---")
-    print(f"Total Successful Requests: {len(clean_df)}")
+    print(f"Total Successful Requests: {successful_count}")
     print(f"Correct Answers: {correct_count}")
     print(f"Incorrect Answers: {incorrect_count}")
     print(f"LLM Accuracy: {accuracy:.2f}%")
 
-    # 4. Create the 'question_type' column on the clean DataFrame
-    clean_df.loc[:, 'question_type'] = clean_df['question_text'].apply(categorize_question)
-    
-    # 5. Error Analysis (on clean data)
-    error_df = clean_df[clean_df['was_llm_correct'] == False]
+    # 4. Failures per question type = tested - correct.
+    # subtract() keeps zero entries, so the chart shows every tested type:
+    # (e.g.) Flaw: 0, Assumption: 0, Method: 1
+    all_tested_counts = tested_counts.copy()
+    all_tested_counts.subtract(correct_counts)
+    error_counts = +all_tested_counts # Drops the types with 0 errors
     
-    if error_df.empty:
+    # 5. Error Analysis
+    if not error_counts:
         print("\n--- Error Analysis ---")
         print("No errors found! The LLM was 100% correct on successful requests.")
         
-        all_tested_types = clean_df['question_type'].value_counts()
-        all_tested_types[:] = 0 # Set all counts to 0
         print("\n--- Generating Visualization ---")
-        create_error_barchart(all_tested_types)
+        create_error_barchart(all_tested_counts)
         return
 
     print("\n--- Recurring Patterns of Error ---")
     print("The LLM struggled most with the following question types:")
     
-    error_counts = error_df['question_type'].value_counts()
-    
-    for q_type, count in error_counts.items():
+    for q_type, count in error_counts.most_common():
         print(f'  - {q_type} \n    (Failed {count} time(s))')
         
     # 6. Create the comprehensive visualization
     print("\n--- Generating Visualization ---")
-    
-    all_tested_counts = clean_df['question_type'].value_counts()
-    all_tested_counts[:] = 0
-    
-    # Now, update this "all 0s" series with the actual error counts
-    # This will result in a chart with (e.g.) Flaw: 0, Assumption: 0, Method: 1
-    all_tested_counts.update(error_counts)
-    
     create_error_barchart(all_tested_counts)
 
 if __name__ == "__main__":
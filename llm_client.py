@@ -1,31 +1,19 @@
-import json
 import os
+import math
+import logging
+import orjson
+import random
 import httpx
 import asyncio
 from dotenv import load_dotenv
 
-try:
-    from load_lsat import fetch_lsat_data
-except ImportError:
-    pass
-
 # API endpoint
 MODEL = "gemini-2.5-flash-preview-09-2025"
 MODEL_ENDPOINT = f"/v1beta/models/{MODEL}:generateContent"
+BASE_URL = "https://generativelanguage.googleapis.com"
 
-async def get_llm_reasoning(lsat_problem, session):
-    """
-    Takes a single LSAT problem, formats it, and calls the Gemini API
-    using a provided httpx.AsyncClient session.
-    """
-    
-    # --- Format Options ---
-    options_text = ""
-    for i, answer_text in enumerate(lsat_problem['answers']):
-        options_text += f"({chr(65 + i)}): {answer_text}\n"
-
-    # --- System Prompt ---
-    system_prompt = """
+# --- System Prompt ---
+SYSTEM_PROMPT = """
 You are a master logician.
 Core Principle: The "type" of question (e.g., Flaw, Assumption) dictates the strategy.
 
@@ -35,7 +23,81 @@ Output Format:
 3. Strategic Evaluation: Analyze each choice based on the strategy.
 4. Final Conclusion: State the correct answer letter.
 """
+
+# Parts of the request that are the same for every problem,
+# built once and shared by all payloads
+SYSTEM_INSTRUCTION = {"parts": [{"text": SYSTEM_PROMPT}]}
+GENERATION_CONFIG = {"temperature": 0.5}
+REQUEST_HEADERS = {"Content-Type": "application/json"}
+
+# Child of main.py's logger, so retry messages share its queued handler
+logger = logging.getLogger("reasoning_maps.llm_client")
+
+# Retry settings for rate-limit (429) and transient server errors.
+# Gemini's quota is per minute, so without a Retry-After hint the
+# backoff schedule (1+2+4+8+16+32s, plus jitter) must add up to more
+# than a 60s window, or a real quota 429 runs out of retries.
+RETRY_STATUS_CODES = (429, 500, 502, 503)
+MAX_RETRIES = 6
+MAX_BACKOFF = 60
+# Longest 'Retry-After' we will wait out (in seconds). The wait holds
+# one of main.py's concurrency slots, so a longer hint fails the request.
+MAX_RETRY_AFTER = 300
+
+def create_session(api_key):
+    """
+    Creates the shared httpx.AsyncClient used for all Gemini requests.
+    HTTP/2 lets concurrent requests share one connection, and
+    connect-level failures are retried by the transport.
+    """
+    limits = httpx.Limits(
+        max_connections=20,
+        max_keepalive_connections=20,
+        keepalive_expiry=60 # Keep idle connections through rate-limit waits
+    )
+    session = httpx.AsyncClient(
+        base_url=BASE_URL,
+        timeout=httpx.Timeout(30.0, connect=5.0), # Fail fast on connect
+        transport=httpx.AsyncHTTPTransport(retries=3, http2=True, limits=limits)
+    )
+    session.api_key = api_key # Add the key to the session
+    return session
+
+def get_retry_delay(response, attempt):
+    """
+    Returns how long to wait before retrying a failed request, or None
+    if it should not be retried.
+    Honors the 'Retry-After' header as-is when present (retrying any
+    sooner would just fail again), unless it asks for more than
+    MAX_RETRY_AFTER. Otherwise uses exponential backoff with jitter.
+    """
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            seconds = float(retry_after)
+        except ValueError:
+            seconds = None # Not a number of seconds (e.g. an HTTP date)
+        if seconds is not None and math.isfinite(seconds): # Ignore 'inf'/'nan'
+            if seconds > MAX_RETRY_AFTER:
+                return None
+            return max(seconds, 0.0)
+    return min(2 ** attempt, MAX_BACKOFF) + random.random()
+
+async def get_llm_reasoning(lsat_problem, session, rate_limiter=None):
+    """
+    Takes a single LSAT problem, formats it, and calls the Gemini API
+    using a provided httpx.AsyncClient session.
+    If a 'rate_limiter' is given, every attempt (retries included)
+    waits on rate_limiter.acquire() before it is sent.
+    Returns (True, reasoning_text) on success, or (False, error_message).
+    """
     
+    # --- Format Options ---
+    options_text = "".join(
+        f"({chr(65 + i)}): {answer_text}\n"
+        for i, answer_text in enumerate(lsat_problem['answers'])
+    )
+
     # --- User Prompt ---
     user_prompt = f"""
 Context: {lsat_problem['context']}
@@ -47,35 +109,50 @@ Choices:
     # --- Gemini Payload ---
     payload = {
         "contents": [{"parts": [{"text": user_prompt}]}],
-        "systemInstruction": {"parts": [{"text": system_prompt}]},
-        "generationConfig": {"temperature": 0.5}
+        "systemInstruction": SYSTEM_INSTRUCTION,
+        "generationConfig": GENERATION_CONFIG
     }
-
-    headers = {"Content-Type": "application/json"}
+    # Serialized once here (orjson is faster than httpx's stdlib json),
+    # and reused as-is if the request is retried
+    body = orjson.dumps(payload)
     
     # --- Make Request ---
     try:
         api_key = session.api_key
         
-        response = await session.post(
-            f"{MODEL_ENDPOINT}?key={api_key}", 
-            headers=headers, 
-            json=payload
-        )
+        for attempt in range(MAX_RETRIES + 1):
+            if rate_limiter is not None:
+                await rate_limiter.acquire()
+            
+            response = await session.post(
+                f"{MODEL_ENDPOINT}?key={api_key}", 
+                headers=REQUEST_HEADERS, 
+                content=body
+            )
+            
+            # Back off and retry on rate limits / transient server errors
+            if response.status_code in RETRY_STATUS_CODES and attempt < MAX_RETRIES:
+                delay = get_retry_delay(response, attempt)
+                if delay is None:
+                    break # Server asked for too long a wait; report the error
+                logger.warning(f"Got {response.status_code}, retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+                continue
+            break
         
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             if 'candidates' in data and data['candidates'][0].get('content', {}).get('parts', [{}])[0].get('text'):
-                return data['candidates'][0]['content']['parts'][0]['text']
+                return True, data['candidates'][0]['content']['parts'][0]['text']
             else:
-                return f"Error: Invalid Gemini response format. {json.dumps(data)}"
+                return False, f"Error: Invalid Gemini response format. {orjson.dumps(data).decode()}"
         else:
-            return f"Error {response.status_code}: {response.text}"
+            return False, f"Error {response.status_code}: {response.text}"
             
     except httpx.ReadTimeout:
-        return "Error: Request timed out."
+        return False, "Error: Request timed out."
     except Exception as e:
-        return f"Request failed: {str(e)}"
+        return False, f"Request failed: {str(e)}"
 
 # --- Main Test Runner ---
 async def main_test():
@@ -92,6 +169,8 @@ async def main_test():
         return
 
     # 1. Fetch Data
+    # Imported here so that importing llm_client doesn't load 'datasets'
+    from load_lsat import fetch_lsat_data
     data = fetch_lsat_data(1)
     if not data:
         print("No data found. Exiting.")
@@ -100,14 +179,12 @@ async def main_test():
     # 2. Send to LLM
     print(f"Analyzing Problem ID: {data[0]['id_string']}...")
     
-    base_url = "https://generativelanguage.googleapis.com"
-    async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as session:
-        session.api_key = api_key # Add the key to the session
-        reasoning = await get_llm_reasoning(data[0], session)
+    async with create_session(api_key) as session:
+        ok, reasoning = await get_llm_reasoning(data[0], session)
     
     # 3. Print Result
     print("\n" + "="*30)
-    print("AI REASONING OUTPUT:")
+    print("AI REASONING OUTPUT:" if ok else "REQUEST FAILED:")
     print("="*30)
     print(reasoning)
 
@@ -1,25 +1,32 @@
 from datasets import load_dataset
+import functools
 import json
 
+DATASET_NAME = "tasksource/lsat-lr"
+
+@functools.lru_cache(maxsize=1)
+def _load_train():
+    """
+    Loads the train split once per process. Later calls return the
+    same memory-mapped Dataset without going through the HF loader.
+    """
+    print(f"Loading dataset: {DATASET_NAME}...")
+    return load_dataset(DATASET_NAME, split="train")
+
 def fetch_lsat_data(num_samples=5):
     """
     Loads the 'tasksource/lsat-lr' dataset from Hugging Face
     and returns a LIST of samples.
     """
-    dataset_name = "tasksource/lsat-lr"
-    samples_list = []
-    
     try:
-        # Load the dataset
-        print(f"Loading dataset: {dataset_name}...")
-        dataset = load_dataset(dataset_name, split="train")
+        # Load the dataset (cached after the first call)
+        dataset = _load_train()
         
         # Get the requested number of samples
         count = min(num_samples, len(dataset))
         
-        # store them in a list
-        for i in range(count):
-            samples_list.append(dataset[i])
+        # Convert the slice to a list of dicts in one Arrow pass
+        samples_list = dataset.select(range(count)).to_list()
             
         print(f"Successfully loaded {len(samples_list)} samples.")
         return samples_list
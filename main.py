@@ -1,69 +1,166 @@
 import asyncio
+import contextlib
+import csv
+import dataclasses
+import logging
+import logging.handlers
 import os
-import pandas as pd
-import httpx
+import queue
+import sys
 import time
+from collections import deque
 from load_lsat import fetch_lsat_data
-from llm_client import get_llm_reasoning
-from reasoning_parser import ReasoningMap
+from llm_client import get_llm_reasoning, create_session
+from reasoning_parser import ReasoningMap, ANSWER_LETTERS
 from dotenv import load_dotenv
 
+# Per-problem progress messages (see queued_logging).
+# Parent of the other modules' loggers (e.g. "reasoning_maps.llm_client"),
+# so their records go through the same queue.
+logger = logging.getLogger("reasoning_maps")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
 # --- CONFIGURATION ---
 NUM_PROBLEMS_TO_ANALYZE = 100
 RESULTS_FILE = "results.csv"
 MAPS_DIR = "reasoning_maps"
-# Wait 6.1 seconds to stay under Gemini's 10 requests/minute limit
-RATE_LIMIT_DELAY = 6.1 
+# Set to False to skip drawing the reasoning maps (results.csv only)
+GENERATE_MAPS = True
+# Max number of LLM requests in flight at once
+MAX_CONCURRENT_REQUESTS = 10
+# Stay under Gemini's 10 requests/minute limit.
+# Every HTTP attempt (retries included) takes a slot, and any 429 that
+# still gets through is retried with backoff in llm_client.
+RATE_LIMIT_REQUESTS = 10
+RATE_LIMIT_WINDOW = 60.0 # seconds
 
-async def process_problem(problem, session):
+class RateLimiter:
     """
-    Analyzes a single LSAT problem and returns a dictionary of results.
-    We pass 'session' to reuse the same httpx client.
+    Sliding-window rate limiter: allows at most 'max_requests' requests
+    to start in any 'window' seconds. Requests go out immediately while
+    there is quota left, instead of waiting a fixed delay each time.
     """
-    print(f"\n--- Analyzing Problem: {problem['id_string']} ---")
+    def __init__(self, max_requests, window):
+        self.max_requests = max_requests
+        self.window = window
+        self.request_times = deque() # Start times of recent requests
+        self.lock = asyncio.Lock()   # Waiters are served in order
 
-    # 1. GET LLM REASONING
-    raw_text = await get_llm_reasoning(problem, session)
+    async def acquire(self):
+        """
+        Waits until a request may start, then records its start time.
+        """
+        async with self.lock:
+            while len(self.request_times) >= self.max_requests:
+                # Wait until the oldest request leaves the window
+                wait = self.request_times[0] + self.window - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self.request_times.popleft()
+            self.request_times.append(time.monotonic())
+
+@contextlib.contextmanager
+def queued_logging():
+    """
+    While active, log records from the "reasoning_maps" loggers are passed
+    through a queue to a background thread that writes them to stdout, so logging from
+    coroutines never blocks the event loop on terminal I/O.
+    """
+    log_queue = queue.SimpleQueue()
+    handler = logging.handlers.QueueHandler(log_queue)
+    listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler(sys.stdout))
     
-    # Check for API errors
-    if raw_text.startswith("Error"):
-        print(f"Failed to get LLM reasoning: {raw_text}")
-        return {
-            "id_string": problem['id_string'],
-            "was_llm_correct": False,
-            "llm_answer": "API Error", # Specific error type
-            "correct_answer": chr(problem['label'] + ord('A')),
-            "question_text": problem['question'],
-            "error_message": raw_text,
-            "map_filename": "N/A"
-        }
-        
-    print("...Got reasoning from LLM.")
+    logger.addHandler(handler)
+    listener.start()
+    try:
+        yield
+    finally:
+        listener.stop() # Writes out any records still in the queue
+        logger.removeHandler(handler)
 
-    # 2. PARSE AND BUILD MAP
+@dataclasses.dataclass(slots=True, frozen=True)
+class ProblemResult:
+    """
+    One row of results.csv (read by analyze_results.py).
+    The field order is the column order.
+    """
+    id_string: str
+    was_llm_correct: bool
+    llm_answer: str
+    correct_answer: str
+    question_text: str
+    error_message: str
+    map_filename: str
+
+RESULT_FIELDS = [field.name for field in dataclasses.fields(ProblemResult)]
+
+def build_result(raw_text, problem, visualize=False):
+    """
+    Parses the LLM's reasoning, optionally draws its map, and returns a
+    ProblemResult. Parsing is one regex pass and the map is a small SVG
+    template, so this is cheap; process_problem only runs it in a thread
+    to keep the map's file write off the event loop.
+    """
+    # 2. PARSE
     map = ReasoningMap(raw_text, problem)
     map.parse_reasoning()
     map.analyze_correctness()
-    map.build_graph()
     
-    # 3. VISUALIZE
-    map_filename = f"{MAPS_DIR}/{problem['id_string']}_map.png"
-    map.visualize(save_path=map_filename)
+    # 3. BUILD MAP AND VISUALIZE
+    # Skipped when no steps were found: the map would only show
+    # a chain of "Missing" nodes
+    map_filename = "N/A"
+    if visualize and map.steps:
+        map.build_graph()
+        map_filename = f"{MAPS_DIR}/{problem['id_string']}_map.svg"
+        map.visualize(save_path=map_filename)
 
     llm_answer_char = "N/A (Parse Fail)" # Default if parser fails
     if map.llm_answer is not None:
-         llm_answer_char = chr(map.llm_answer + ord('A'))
+         llm_answer_char = ANSWER_LETTERS[map.llm_answer]
 
     # 4. RETURN RESULTS
-    return {
-        "id_string": problem['id_string'],
-        "was_llm_correct": map.is_correct,
-        "llm_answer": llm_answer_char,
-        "correct_answer": chr(problem['label'] + ord('A')),
-        "question_text": problem['question'],
-        "error_message": "N/A",
-        "map_filename": map_filename
-    }
+    return ProblemResult(
+        id_string=problem['id_string'],
+        was_llm_correct=map.is_correct,
+        llm_answer=llm_answer_char,
+        correct_answer=ANSWER_LETTERS[problem['label']],
+        question_text=problem['question'],
+        error_message="N/A",
+        map_filename=map_filename
+    )
+
+async def process_problem(problem, session, semaphore, rate_limiter):
+    """
+    Analyzes a single LSAT problem and returns a ProblemResult.
+    We pass 'session' to reuse the same httpx client, 'semaphore' and
+    'rate_limiter' to cap concurrent and per-minute LLM requests
+    (every attempt, including retries, takes a rate-limit slot).
+    """
+    # 1. GET LLM REASONING
+    async with semaphore:
+        logger.info(f"\n--- Analyzing Problem: {problem['id_string']} ---")
+        ok, raw_text = await get_llm_reasoning(problem, session, rate_limiter)
+    
+    # Check for API errors
+    if not ok:
+        logger.info(f"Failed to get LLM reasoning: {raw_text}")
+        return ProblemResult(
+            id_string=problem['id_string'],
+            was_llm_correct=False,
+            llm_answer="API Error", # Specific error type
+            correct_answer=ANSWER_LETTERS[problem['label']],
+            question_text=problem['question'],
+            error_message=raw_text,
+            map_filename="N/A"
+        )
+        
+    logger.info("...Got reasoning from LLM.")
+
+    # Parse and save the map in a thread, so other problems'
+    # LLM requests keep running during the file write
+    return await asyncio.to_thread(build_result, raw_text, problem, GENERATE_MAPS)
 
 async def main():
     """
@@ -72,9 +169,8 @@ async def main():
     print(f"--- Starting Reasoning Map Analysis for {NUM_PROBLEMS_TO_ANALYZE} problems ---")
     
     # Create directory for maps if it doesn't exist
-    if not os.path.exists(MAPS_DIR):
-        os.makedirs(MAPS_DIR)
-        print(f"Created directory: {MAPS_DIR}")
+    if GENERATE_MAPS:
+        os.makedirs(MAPS_DIR, exist_ok=True)
 
     # 1. FETCH DATA
     lsat_data = fetch_lsat_data(num_samples=NUM_PROBLEMS_TO_ANALYZE)
@@ -84,9 +180,6 @@ async def main():
         
     print(f"Loaded {len(lsat_data)} problems.")
     
-    # List to store all our results
-    all_results = []
-    
     load_dotenv()
     api_key = os.getenv("LLM_KEY")
     
@@ -94,28 +187,30 @@ async def main():
          print("CRITICAL: LLM_KEY not found in .env. Exiting.")
          return
          
-    base_url = "https://generativelanguage.googleapis.com"
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    rate_limiter = RateLimiter(RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW)
     
-    async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as session:
-        session.api_key = api_key 
-        
-        for i, problem in enumerate(lsat_data):
-            result = await process_problem(problem, session)
-            all_results.append(result)
+    with queued_logging():
+        async with create_session(api_key) as session:
+            tasks = [
+                process_problem(problem, session, semaphore, rate_limiter)
+                for problem in lsat_data
+            ]
             
-            # Don't sleep after the very last item
-            if i < len(lsat_data) - 1:
-                print(f"Waiting {RATE_LIMIT_DELAY}s to avoid rate limit...")
-                await asyncio.sleep(RATE_LIMIT_DELAY) # Wait
+            # 5. SAVE TO CSV
+            # Write each row as soon as its problem finishes, so a crash
+            # mid-run keeps everything completed so far.
+            with open(RESULTS_FILE, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(RESULT_FIELDS)
+                
+                for done, next_result in enumerate(asyncio.as_completed(tasks), start=1):
+                    result = await next_result
+                    writer.writerow(dataclasses.astuple(result))
+                    f.flush()
+                    logger.info(f"Done {result.id_string} ({done}/{len(tasks)})")
 
-    # 5. SAVE TO CSV
     print(f"\n--- Analysis Complete ---")
-    
-    # Convert list of dictionaries to a pandas DataFrame
-    df = pd.DataFrame(all_results)
-    
-    # Save the DataFrame to a CSV file
-    df.to_csv(RESULTS_FILE, index=False)
     print(f"All results saved to {RESULTS_FILE}")
 
     # 6. PRINT SUMMARY (moved to analyze_results.py)
@@ -1,59 +1,117 @@
 import re
-import networkx as nx
-import matplotlib.pyplot as plt
+import logging
+from html import escape
+
+# Child of main.py's logger, so per-problem messages share its queued handler
+logger = logging.getLogger("reasoning_maps.parser")
+
+# The steps the system prompt asks the LLM to output, in order.
+# A tuple, since the patterns and SVG layout below are built from it
+STEP_TITLES = (
+    "Argument Breakdown", 
+    "Question Analysis", 
+    "Strategic Evaluation", 
+    "Final Conclusion"
+)
+
+# One pattern that matches any step title (case-insensitive),
+# followed by an optional ':' and whitespace
+STEPS_PATTERN = re.compile(
+    rf"({'|'.join(re.escape(title) for title in STEP_TITLES)}):?\s*\n?",
+    re.IGNORECASE
+)
+# Maps a matched title, case-folded, back to its canonical spelling
+TITLE_BY_FOLDED = {title.casefold(): title for title in STEP_TITLES}
+
+# Answer choices, by index (problem['label'] is an index into this)
+ANSWER_LETTERS = "ABCDE"
+ANSWER_INDEX = {letter: i for i, letter in enumerate(ANSWER_LETTERS)}
+
+# Tries to find "The answer is A" or "Conclusion: (B)"
+ANSWER_PATTERN = re.compile(r"(?:answer is|conclusion:)\s*\(?([A-E])\)?", re.IGNORECASE)
+# Fallback: any single answer letter
+LETTER_PATTERN = re.compile(r"\b([A-E])\b")
+
+# --- SVG layout for the reasoning maps (in pixels) ---
+# The map is always a single top-to-bottom chain of nodes, so it is
+# drawn from a fixed template instead of a general graph layout.
+SVG_WIDTH = 600
+SVG_TITLE_HEIGHT = 70
+SVG_NODE_SPACING = 140
+SVG_NODE_RADIUS = 55
+SVG_CENTER_X = SVG_WIDTH // 2
+
+# Every node the chain can contain ("Context", then each step either
+# found or "Missing"), with its fixed y position and its colour.
+# The "Final Conclusion" colour depends on correctness (see visualize).
+NODE_Y = {"Context": SVG_TITLE_HEIGHT + SVG_NODE_RADIUS}
+NODE_COLORS = {"Context": "#cceeff"} # Light blue
+for i, title in enumerate(STEP_TITLES, start=1):
+    NODE_Y[title] = NODE_Y[f"Missing:\n{title}"] = NODE_Y["Context"] + i * SVG_NODE_SPACING
+    NODE_COLORS[title] = "#ffddc1" # Light orange
+    NODE_COLORS[f"Missing:\n{title}"] = "#f0f0f0" # Grey
+NODE_COLORS["Missing:\nFinal Conclusion"] = "#ffcccc" # Light red (missing)
+SVG_HEIGHT = max(NODE_Y.values()) + SVG_NODE_RADIUS + 30
+# Text drawn on a node, when it differs from the node's name
+NODE_LABELS = {"Context": "Problem Context"}
+
+SVG_HEADER = """<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}" font-family="sans-serif">
+<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="8" markerHeight="8" orient="auto"><path d="M 0 0 L 10 5 L 0 10 z"/></marker></defs>
+<rect width="100%" height="100%" fill="white"/>
+<text x="{center}" y="40" text-anchor="middle" font-size="18">{title}</text>
+"""
+SVG_EDGE = '<line x1="{x}" y1="{y1}" x2="{x}" y2="{y2}" stroke="black" stroke-width="1.5" marker-end="url(#arrow)"/>\n'
+SVG_NODE = '<circle cx="{x}" cy="{y}" r="{r}" fill="{color}"/>\n'
+SVG_LABEL = '<text x="{x}" y="{y}" text-anchor="middle" dominant-baseline="middle" font-size="12" font-weight="bold">{lines}</text>\n'
+SVG_LABEL_LINE = '<tspan x="{x}" dy="{dy}">{text}</tspan>'
 
 class ReasoningMap:
     def __init__(self, raw_llm_text, lsat_problem):
         self.raw_text = raw_llm_text
         self.problem = lsat_problem
-        self.graph = nx.DiGraph()
+        self.chain = [] # Map nodes in order; each one points to the next
         self.steps = {} # Store the parsed text for each step
         self.is_correct = False
         self.llm_answer = None
-        self.step_titles = [
-            "Argument Breakdown", 
-            "Question Analysis", 
-            "Strategic Evaluation", 
-            "Final Conclusion"
-        ]
+        self.step_titles = STEP_TITLES
 
     def parse_reasoning(self):
         """
         A more robust parser. Instead of one complex regex, this looks
         for the step titles (e.g., "Argument Breakdown") and captures
         all text until the next title or the end of the string.
+        All titles are found in a single scan of the text.
         """
         text = self.raw_text
         
+        # Every place a step title appears, grouped by title
+        title_matches = {}
+        for match in STEPS_PATTERN.finditer(text):
+            title = TITLE_BY_FOLDED[match.group(1).casefold()] # Normalize case
+            title_matches.setdefault(title, []).append(match)
+        
         for i, title in enumerate(self.step_titles):
-            # Create a regex to find the title.
-            # re.IGNORECASE makes it case-insensitive.
-            # It looks for the title, followed by an optional ':', ' ', or '**'
-            start_pattern = re.compile(rf"{re.escape(title)}:?\s*\n?", re.IGNORECASE)
-            match = start_pattern.search(text)
-            
-            if not match:
+            if title not in title_matches:
                 continue # Could not find this step
+            
+            # Use the first time the title appears
+            match = title_matches[title][0]
 
             # This is the text *after* the title
             content_start = match.end()
-            content = ""
 
             # Now, find where this content *ends*
-            # It ends at the start of the *next* step, or the end of the string
-            end_match = None
+            # It ends at the first *next* step title after our match,
+            # or the end of the string
+            content_end = len(text)
             if i + 1 < len(self.step_titles):
                 next_title = self.step_titles[i+1]
-                next_pattern = re.compile(rf"{re.escape(next_title)}:?\s*\n?", re.IGNORECASE)
-                end_match = next_pattern.search(text, content_start) # Search *after* our match
-
-            if end_match:
-                content = text[content_start : end_match.start()]
-            else:
-                # It's the last step, so just take all remaining text
-                content = text[content_start:]
+                for next_match in title_matches.get(next_title, []):
+                    if next_match.start() >= content_start:
+                        content_end = next_match.start()
+                        break
             
-            self.steps[title] = content.strip()
+            self.steps[title] = text[content_start:content_end].strip()
 
     def analyze_correctness(self):
         """
@@ -70,25 +128,27 @@ class ReasoningMap:
             # If the parser couldn't find the "Final Conclusion" step,
             # fall back to searching the *entire raw text*.
             # This handles cases where the LLM forgets the header.
-            print(f"Warning: Parser could not find 'Final Conclusion' step for {self.problem['id_string']}. Searching full text.")
+            logger.warning(f"Warning: Parser could not find 'Final Conclusion' step for {self.problem['id_string']}. Searching full text.")
             search_text = self.raw_text
 
         # Look for the answer letter (A, B, C, D, or E)
-        # Tries to find "The answer is A" or "Conclusion: (B)"
-        match = re.search(r"(?:answer is|conclusion:)\s*\(?([A-E])\)?", search_text, re.IGNORECASE)
+        match = ANSWER_PATTERN.search(search_text)
         
         if not match:
              # Fallback: just find the last single letter in the text
-             matches = re.findall(r"\b([A-E])\b", search_text)
-             if matches:
-                letter = matches[-1].upper() # Get the last one
-                self.llm_answer = ord(letter) - ord('A')
+             # (only the last match is kept, no list of all of them)
+             last_match = None
+             for last_match in LETTER_PATTERN.finditer(search_text):
+                pass
+             if last_match:
+                letter = last_match.group(1) # Get the last one
+                self.llm_answer = ANSWER_INDEX[letter]
              else:
-                print(f"Warning: Could not parse answer letter from text for {self.problem['id_string']}.")
+                logger.warning(f"Warning: Could not parse answer letter from text for {self.problem['id_string']}.")
                 return # Give up
         else:
             letter = match.group(1).upper()
-            self.llm_answer = ord(letter) - ord('A')
+            self.llm_answer = ANSWER_INDEX[letter]
         
         # Check correctness of answer
         if self.llm_answer is not None and self.llm_answer == self.problem['label']:
@@ -96,74 +156,66 @@ class ReasoningMap:
         
     def build_graph(self):
         """
-        Builds the actual NetworkX graph from the parsed steps.
+        Builds the reasoning chain from the parsed steps.
+        The map is always linear, so it is stored as a list of nodes
+        and the edges are the consecutive pairs.
         """
-        self.graph.add_node("Context", label="Problem Context")
+        self.chain.append("Context")
         
-        last_node = "Context"
         for title in self.step_titles:
             if title in self.steps:
-                self.graph.add_node(title, label=title)
-                self.graph.add_edge(last_node, title)
-                last_node = title
+                self.chain.append(title)
             else:
                 # Add a "Missing" node to show the break in the chain
-                missing_title = f"Missing:\n{title}"
-                self.graph.add_node(missing_title, label=missing_title)
-                self.graph.add_edge(last_node, missing_title)
-                last_node = missing_title
+                self.chain.append(f"Missing:\n{title}")
 
 
-    def visualize(self, save_path="reasoning_map.png"):
+    def visualize(self, save_path="reasoning_map.svg"):
         """
-        Draws the graph using Matplotlib and saves it to a file.
+        Draws the chain as an SVG image and saves it to a file.
         """
-        if self.graph.number_of_nodes() == 0:
-            print("Graph is empty, cannot visualize.")
+        if not self.chain:
+            logger.warning("Chain is empty, cannot visualize.")
             return
 
-        plt.figure(figsize=(10, 10))
+        x = SVG_CENTER_X
         
-        # Create a fixed, top-to-bottom layout
-        pos = {}
-        node_list = list(self.graph.nodes())
-        y = len(node_list)
-        for node in node_list:
-            pos[node] = (0, y)
-            y -= 1
+        # Only the "Final Conclusion" colour changes between maps
+        conclusion_color = "#ccffcc" if self.is_correct else "#ffcccc" # Green/Red
+
+        parts = [SVG_HEADER.format(
+            width=SVG_WIDTH,
+            height=SVG_HEIGHT,
+            center=x,
+            title=escape(f"Reasoning Map for: {self.problem['id_string']}")
+        )]
+        
+        # Edges first, so the nodes are drawn on top of them
+        for source, target in zip(self.chain, self.chain[1:]):
+            parts.append(SVG_EDGE.format(
+                x=x,
+                y1=NODE_Y[source] + SVG_NODE_RADIUS,
+                y2=NODE_Y[target] - SVG_NODE_RADIUS
+            ))
+        
+        for node in self.chain:
+            color = conclusion_color if node == "Final Conclusion" else NODE_COLORS[node]
+            parts.append(SVG_NODE.format(x=x, y=NODE_Y[node], r=SVG_NODE_RADIUS, color=color))
             
-        # Determine node colors
-        color_map = []
-        for node in self.graph:
-            if "Final Conclusion" in node and node.startswith("Missing"):
-                color_map.append("#ffcccc") # Light red (missing)
-            elif "Final Conclusion" in node:
-                color_map.append("#ccffcc" if self.is_correct else "#ffcccc") # Green/Red
-            elif "Context" in node:
-                color_map.append("#cceeff") # Light blue
-            elif "Missing" in node:
-                color_map.append("#f0f0f0") # Grey
-            else:
-                color_map.append("#ffddc1") # Light orange
-
-        nx.draw(
-            self.graph,
-            pos,
-            with_labels=True,
-            node_color=color_map,
-            node_size=6000,
-            font_size=10,
-            arrows=True,
-            arrowstyle='-|>',
-            arrowsize=20,
-            node_shape='o',
-            font_weight='bold',
-            labels=nx.get_node_attributes(self.graph, 'label')
-        )
+            # One <tspan> per line, centred vertically on the node:
+            # the first line is shifted up, each next one is 1.2em lower
+            lines = NODE_LABELS.get(node, node).split("\n")
+            first_dy = f"{0.6 * (1 - len(lines)):g}em"
+            label_lines = "".join(
+                SVG_LABEL_LINE.format(x=x, dy="1.2em" if i else first_dy, text=escape(line))
+                for i, line in enumerate(lines)
+            )
+            parts.append(SVG_LABEL.format(x=x, y=NODE_Y[node], lines=label_lines))
         
-        plt.title(f"Reasoning Map for: {self.problem['id_string']}", size=15)
+        parts.append("</svg>\n")
         
-        # Save the file
-        plt.savefig(save_path)
-        plt.close() # Close the plot to save memory
-        print(f"Map saved to {save_path}")
\ No newline at end of file
+        # Save the file: encode once and write the bytes in one call.
+        # SVG defaults to UTF-8, whatever the platform's locale is.
+        with open(save_path, "wb") as f:
+            f.write("".join(parts).encode("utf-8"))
+        logger.info(f"Map saved to {save_path}")